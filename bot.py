@@ -1,19 +1,19 @@
 import asyncio
-from typing import Optional, List
+import logging
+import os
+from typing import Optional, List, Any, Literal
 from datetime import datetime
 import platform
+from collections import OrderedDict
 
-from aiogram import Bot, Dispatcher, types
+from aiogram import Bot, Dispatcher, Router, types
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, select
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableSequence
-from langchain_community.llms import FakeListLLM  # For testing
-from pydantic import BaseModel
+from sqlalchemy import String, Integer, DateTime, Index, bindparam, select, insert, update, delete, event, func
+from pydantic import BaseModel, model_validator
 
 # --- Database Models ---
 class Base(DeclarativeBase):
@@ -21,10 +21,11 @@ class Base(DeclarativeBase):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_user_id_id", "user_id", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, nullable=False)
     description: Mapped[str] = mapped_column(String, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 # --- Pydantic Models ---
 class TaskCreate(BaseModel):
@@ -33,116 +34,357 @@ class TaskCreate(BaseModel):
 class TaskUpdate(BaseModel):
     description: Optional[str] = None
 
+class ActionModel(BaseModel):
+    action: Literal["create", "read", "update", "delete", "list"]
+    id: Optional[int] = None
+    description: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_required_fields(self) -> "ActionModel":
+        if self.action == "create" and not self.description:
+            raise ValueError("create requires a description")
+        if self.action in ("read", "update", "delete") and self.id is None:
+            raise ValueError(f"{self.action} requires an id")
+        return self
+
 class TaskResponse(BaseModel):
     id: int
     description: str
     created_at: datetime
 
 # --- Repository Layer ---
+# Statements are built once and reused with bound parameters, so each call only
+# looks up the already-compiled SQL in the engine's statement cache
+TASK_COLUMNS = (Task.id, Task.description, Task.created_at)
+OWNED_TASK = (Task.id == bindparam("task_id"), Task.user_id == bindparam("owner_id"))
+
+INSERT_TASKS = insert(Task).returning(Task.id, Task.user_id, Task.description, Task.created_at)
+SELECT_TASK = select(*TASK_COLUMNS).where(*OWNED_TASK)
+UPDATE_TASK_DESCRIPTION = (
+    update(Task)
+    .where(*OWNED_TASK)
+    .values(description=bindparam("new_description"))
+    .returning(*TASK_COLUMNS)
+)
+DELETE_TASK = delete(Task).where(*OWNED_TASK).returning(Task.id)
+LIST_TASKS = (
+    select(*TASK_COLUMNS)
+    .where(Task.user_id == bindparam("owner_id"))
+    .execution_options(yield_per=128)
+)
+LIST_TASK_LINES = (
+    select(Task.id, Task.description)
+    .where(Task.user_id == bindparam("owner_id"))
+    .execution_options(yield_per=128)
+)
+
 class TaskRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
         self.session = session
+        # With autocommit off, writes are only flushed and the caller owns the commit
+        self.autocommit = autocommit
+
+    async def _commit(self):
+        if self.autocommit:
+            await self.session.commit()
+        else:
+            await self.session.flush()
 
     async def create(self, user_id: int, task: TaskCreate) -> TaskResponse:
         db_task = Task(user_id=user_id, description=task.description)
         self.session.add(db_task)
-        await self.session.commit()
+        await self._commit()
         await self.session.refresh(db_task)
-        return TaskResponse(id=db_task.id, description=db_task.description, created_at=db_task.created_at)
+        # Values come straight from the database, so skip validation
+        return TaskResponse.model_construct(id=db_task.id, description=db_task.description, created_at=db_task.created_at)
 
-    async def read(self, user_id: int, task_id: int) -> Optional[TaskResponse]:
+    async def create_many(self, items: List[tuple[int, TaskCreate]]) -> List[TaskResponse]:
+        # Not ordering the RETURNING rows lets SQLite take a single multi-row INSERT.
+        # Rows are matched back to items on (user_id, description), so every caller gets a
+        # row with its own user and description; items with identical pairs may swap IDs.
         result = await self.session.execute(
-            select(Task).where(Task.id == task_id, Task.user_id == user_id)
+            INSERT_TASKS,
+            [{"user_id": user_id, "description": task.description} for user_id, task in items],
         )
-        task = result.scalar_one_or_none()
-        if task:
-            return TaskResponse(id=task.id, description=task.description, created_at=task.created_at)
+        created: dict[tuple[int, str], List[TaskResponse]] = {}
+        for r in result.all():
+            created.setdefault((r.user_id, r.description), []).append(
+                TaskResponse.model_construct(id=r.id, description=r.description, created_at=r.created_at)
+            )
+        await self._commit()
+        return [created[(user_id, task.description)].pop() for user_id, task in items]
+
+    async def read(self, user_id: int, task_id: int) -> Optional[TaskResponse]:
+        result = await self.session.execute(SELECT_TASK, {"task_id": task_id, "owner_id": user_id})
+        row = result.one_or_none()
+        if row:
+            return TaskResponse.model_construct(id=row.id, description=row.description, created_at=row.created_at)
         return None
 
     async def update(self, user_id: int, task_id: int, task: TaskUpdate) -> Optional[TaskResponse]:
+        if not task.description:
+            return await self.read(user_id, task_id)
         result = await self.session.execute(
-            select(Task).where(Task.id == task_id, Task.user_id == user_id)
+            UPDATE_TASK_DESCRIPTION,
+            {"task_id": task_id, "owner_id": user_id, "new_description": task.description},
         )
-        db_task = result.scalar_one_or_none()
-        if db_task:
-            if task.description:
-                db_task.description = task.description
-            await self.session.commit()
-            await self.session.refresh(db_task)
-            return TaskResponse(id=db_task.id, description=db_task.description, created_at=db_task.created_at)
+        row = result.one_or_none()
+        await self._commit()
+        if row:
+            return TaskResponse.model_construct(id=row.id, description=row.description, created_at=row.created_at)
         return None
 
     async def delete(self, user_id: int, task_id: int) -> bool:
-        result = await self.session.execute(
-            select(Task).where(Task.id == task_id, Task.user_id == user_id)
-        )
-        task = result.scalar_one_or_none()
-        if task:
-            await self.session.delete(task)
-            await self.session.commit()
-            return True
-        return False
+        result = await self.session.execute(DELETE_TASK, {"task_id": task_id, "owner_id": user_id})
+        deleted_id = result.scalar_one_or_none()
+        await self._commit()
+        return deleted_id is not None
 
     async def list(self, user_id: int) -> List[TaskResponse]:
-        result = await self.session.execute(
-            select(Task).where(Task.user_id == user_id)
-        )
-        tasks = result.scalars().all()
-        return [TaskResponse(id=t.id, description=t.description, created_at=t.created_at) for t in tasks]
+        # Stream rows in chunks instead of buffering the full result before building responses
+        result = await self.session.stream(LIST_TASKS, {"owner_id": user_id})
+        return [TaskResponse.model_construct(id=r.id, description=r.description, created_at=r.created_at)
+                async for r in result]
+
+    async def list_formatted(self, user_id: int) -> str:
+        # For display only: format rows as they stream in, without building TaskResponse objects
+        result = await self.session.stream(LIST_TASK_LINES, {"owner_id": user_id})
+        return "\n".join([f"📝 ID: {r.id}, Description: {r.description}" async for r in result])
 
 # --- Analyzer Layer ---
+# Kept free of runtime data so providers can cache it as a stable prompt prefix.
+# Braces are doubled because the system message is itself a prompt template.
+ANALYSIS_INSTRUCTIONS = (
+    "You classify messages sent to a Telegram task manager.\n"
+    "Determine the action (create, read, update, delete, list) and relevant details.\n"
+    "Reply with a single JSON object with the keys \"action\", \"id\" and \"description\", "
+    "omitting keys that do not apply.\n"
+    "Examples:\n"
+    '{{"action": "create", "description": "Buy groceries"}}\n'
+    '{{"action": "list"}}\n'
+    '{{"action": "read", "id": 3}}\n'
+    '{{"action": "update", "id": 1, "description": "Buy groceries and milk"}}\n'
+    '{{"action": "delete", "id": 1}}'
+)
+
+# Only side-effect-free intents are safe to answer from cache
+CACHEABLE_ACTIONS = {"list", "read"}
+
 class TaskAnalyzer:
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
+        # LangChain is heavy to import; load it only when an analyzer is built
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import PydanticOutputParser
+        from langchain_core.exceptions import OutputParserException
+        from langchain_community.llms import FakeListLLM  # For testing
+
+        self.cache: OrderedDict[str, dict] = OrderedDict()
+        self.cache_size = cache_size
+        self.parse_error = OutputParserException
         self.llm = FakeListLLM(responses=[
-            'Action: create, Description: "Buy groceries"',
-            'Action: list',
-            'Action: update, ID: 1, Description: "Buy groceries and milk"',
-            'Action: delete, ID: 1'
+            '{"action": "create", "description": "Buy groceries"}',
+            '{"action": "list"}',
+            '{"action": "update", "id": 1, "description": "Buy groceries and milk"}',
+            '{"action": "delete", "id": 1}'
         ])
-        self.prompt = PromptTemplate.from_template(
-            "Determine action (create, read, update, delete, list) and relevant details: {input}"
-        )
-        self.chain = self.prompt | self.llm | StrOutputParser()
-
-    def analyze(self, user_input: str) -> dict:
-        result = self.chain.invoke({"input": user_input})
-        action = None
-        details = {}
-        for part in result.split(","):
-            if "Action:" in part:
-                action = part.split(":")[1].strip()
-            elif "Description:" in part:
-                details["description"] = part.split("Description:")[1].strip().strip('"')
-            elif "ID:" in part:
-                details["id"] = int(part.split("ID:")[1].strip())
-        return {"action": action, **details}
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", ANALYSIS_INSTRUCTIONS),
+            ("human", "{input}"),
+        ])
+        # With a chat model that supports it, prompt | llm.with_structured_output(ActionModel) also works
+        self.chain = self.prompt | self.llm | PydanticOutputParser(pydantic_object=ActionModel)
+
+    async def analyze(self, user_input: str) -> dict:
+        key = " ".join(user_input.lower().split())
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            return dict(cached)
+        try:
+            result = await self.chain.ainvoke({"input": user_input})
+        except self.parse_error:
+            # The LLM reply was not a valid ActionModel
+            return {"action": None}
+        analysis = result.model_dump(exclude_none=True)
+        if analysis["action"] in CACHEABLE_ACTIONS:
+            self.cache[key] = analysis
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(analysis)
 
 # --- Service Layer ---
+# (repository method name, positional arguments, future for the result)
+WriteOp = tuple[str, tuple, asyncio.Future]
+
+class ListReadState:
+    # Per-user bookkeeping that only exists while list reads for that user are in flight
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.version = 0
+        self.readers = 0
+
 class TaskService:
-    def __init__(self, repository: TaskRepository):
-        self.repository = repository
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession],
+                 batch_size: int = 64, batch_window: float = 0.002, list_cache_size: int = 1024):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._write_queue: asyncio.Queue[WriteOp] = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        # Set by stop() so late writes fail instead of starting a writer nobody stops
+        self._stopped = False
+        # Formatted task lists per user, dropped whenever that user's tasks change
+        self._list_cache: OrderedDict[int, str] = OrderedDict()
+        self.list_cache_size = list_cache_size
+        self._list_reads: dict[int, ListReadState] = {}
+
+    def start(self):
+        self._stopped = False
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run_writer())
+
+    async def stop(self):
+        self._stopped = True
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        # A writer cancelled before it first ran never reaches its cleanup
+        self._fail_pending([])
+
+    async def _write(self, method: str, *args) -> Any:
+        if self._stopped:
+            raise RuntimeError("TaskService writer stopped")
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((method, args, future))
+        return await future
+
+    async def _run_writer(self):
+        batch: List[WriteOp] = []
+        try:
+            while True:
+                batch = [await self._write_queue.get()]
+                # Give concurrent handlers a moment to enqueue so they share one commit
+                await asyncio.sleep(self.batch_window)
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._write_queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+                await self._write_batch(batch)
+                batch = []
+        finally:
+            # An interrupted batch is rolled back when its session closes
+            self._fail_pending(batch)
+
+    def _fail_pending(self, batch: List[WriteOp]):
+        # Fail whatever was in flight or still queued so no caller waits forever
+        while not self._write_queue.empty():
+            batch.append(self._write_queue.get_nowait())
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("TaskService writer stopped"))
+
+    async def _write_batch(self, batch: List[WriteOp]):
+        creates = [op for op in batch if op[0] == "create"]
+        others = [op for op in batch if op[0] != "create"]
+        # (result, error) per op, in creates + others order
+        outcomes: List[tuple[Any, Optional[Exception]]] = []
+        try:
+            async with self.session_factory() as session:
+                repository = TaskRepository(session, autocommit=False)
+                # Each step runs in its own SAVEPOINT so a failure only fails its own callers.
+                # All creates in the batch go out as a single multi-row INSERT.
+                if creates:
+                    try:
+                        async with session.begin_nested():
+                            created = await repository.create_many([args for _, args, _ in creates])
+                        outcomes.extend((task, None) for task in created)
+                    except Exception as e:
+                        outcomes.extend((None, e) for _ in creates)
+                for method, args, _ in others:
+                    try:
+                        async with session.begin_nested():
+                            result = await getattr(repository, method)(*args)
+                        outcomes.append((result, None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+                await session.commit()
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, args, future), (result, error) in zip(creates + others, outcomes):
+            if error is None:
+                self._invalidate_list(args[0])
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
 
-    async def handle_action(self, user_id: int, analysis: dict) -> str:
+    def _invalidate_list(self, user_id: int):
+        self._list_cache.pop(user_id, None)
+        state = self._list_reads.get(user_id)
+        if state is not None:
+            # Tells an in-flight read that its result may already be stale
+            state.version += 1
+
+    async def list_tasks(self, user_id: int) -> str:
+        cached = self._list_cache.get(user_id)
+        if cached is not None:
+            self._list_cache.move_to_end(user_id)
+            return cached
+        state = self._list_reads.get(user_id)
+        if state is None:
+            state = self._list_reads[user_id] = ListReadState()
+        state.readers += 1
+        try:
+            # Concurrent misses for the same user wait for a single query
+            async with state.lock:
+                cached = self._list_cache.get(user_id)
+                if cached is not None:
+                    return cached
+                version = state.version
+                async with self.session_factory() as session:
+                    tasks = await TaskRepository(session).list_formatted(user_id)
+                if state.version == version:
+                    self._list_cache[user_id] = tasks
+                    if len(self._list_cache) > self.list_cache_size:
+                        self._list_cache.popitem(last=False)
+                return tasks
+        finally:
+            state.readers -= 1
+            if not state.readers:
+                del self._list_reads[user_id]
+
+    async def handle_action(self, user_id: int, analysis: dict,
+                            prefetched: Optional[str] = None) -> str:
         action = analysis.get("action")
         if action == "create":
             task = TaskCreate(description=analysis["description"])
-            result = await self.repository.create(user_id, task)
+            result = await self._write("create", user_id, task)
             return f"✅ Task created: {result.description} (ID: {result.id})"
         elif action == "read":
-            task = await self.repository.read(user_id, analysis["id"])
+            async with self.session_factory() as session:
+                task = await TaskRepository(session).read(user_id, analysis["id"])
             return f"📄 Task: {task.description} (ID: {task.id})" if task else "❌ Task not found"
         elif action == "update":
             task = TaskUpdate(description=analysis.get("description"))
-            result = await self.repository.update(user_id, analysis["id"], task)
+            result = await self._write("update", user_id, analysis["id"], task)
             return f"✏️ Task updated: {result.description} (ID: {result.id})" if result else "❌ Task not found"
         elif action == "delete":
-            success = await self.repository.delete(user_id, analysis["id"])
+            success = await self._write("delete", user_id, analysis["id"])
             return "🗑 Task deleted" if success else "❌ Task not found"
         elif action == "list":
-            tasks = await self.repository.list(user_id)
-            if not tasks:
-                return "📭 No tasks found"
-            return "\n".join(f"📝 ID: {t.id}, Description: {t.description}" for t in tasks)
+            tasks = prefetched if prefetched is not None else await self.list_tasks(user_id)
+            return tasks or "📭 No tasks found"
         return "❌ Invalid action"
 
 # --- UI Keyboard ---
@@ -153,54 +395,125 @@ def create_main_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+# --- Router ---
+BUTTON_INPUTS = {
+    "➕ Add Task": "create task: Buy groceries",
+    "📋 List Tasks": "list tasks",
+    "✏ Update Task": "update task ID: 1, Description: Buy eggs",
+    "🗑 Delete Task": "delete task ID: 1"
+}
+
+async def start_command(message: types.Message):
+    await message.answer(
+        "👋 Welcome to the Task Bot!\nChoose an action or type a task description.",
+        reply_markup=create_main_keyboard()
+    )
+
+async def handle_message(message: types.Message, service: TaskService, analyzer: TaskAnalyzer):
+    user_input = message.text.strip()
+    interpreted_input = BUTTON_INPUTS.get(user_input, user_input)
+    user_id = message.from_user.id
+    prefetched = None
+    if "list" in interpreted_input.lower():
+        # Likely a list request: fetch the tasks while the LLM classifies the input
+        try:
+            async with asyncio.TaskGroup() as tg:
+                analysis_task = tg.create_task(analyzer.analyze(interpreted_input))
+                list_task = tg.create_task(service.list_tasks(user_id))
+        except ExceptionGroup as group:
+            # Re-raise the original error so aiogram error handlers can match on its type
+            raise group.exceptions[0] from None
+        analysis = analysis_task.result()
+        prefetched = list_task.result()
+    else:
+        analysis = await analyzer.analyze(interpreted_input)
+    response = await service.handle_action(user_id, analysis, prefetched)
+    await message.answer(response, reply_markup=create_main_keyboard())
+
+def build_router() -> Router:
+    # A Router can only be attached to one Dispatcher, so each bot gets its own.
+    # The handlers are shared module-level functions, but this means registration
+    # (filter setup and handler wrapping) runs again for every TaskBot instance.
+    router = Router()
+    router.message(Command("start"))(start_command)
+    router.message()(handle_message)
+    return router
+
 # --- Bot Layer ---
 class TaskBot:
-    def __init__(self, token: str, repository: TaskRepository, analyzer: TaskAnalyzer):
+    def __init__(self, token: str, session_factory: async_sessionmaker[AsyncSession], analyzer: TaskAnalyzer):
         self.bot = Bot(token=token)
         self.dp = Dispatcher()
-        self.service = TaskService(repository)
+        self.service = TaskService(session_factory)
         self.analyzer = analyzer
-        self._register_handlers()
-
-    def _register_handlers(self):
-        @self.dp.message(Command("start"))
-        async def start_command(message: types.Message):
-            await message.answer(
-                "👋 Welcome to the Task Bot!\nChoose an action or type a task description.",
-                reply_markup=create_main_keyboard()
-            )
-
-        @self.dp.message()
-        async def handle_message(message: types.Message):
-            user_input = message.text.strip()
-            emoji_map = {
-                "➕ Add Task": "create task: Buy groceries",
-                "📋 List Tasks": "list tasks",
-                "✏ Update Task": "update task ID: 1, Description: Buy eggs",
-                "🗑 Delete Task": "delete task ID: 1"
-            }
-            interpreted_input = emoji_map.get(user_input, user_input)
-            analysis = self.analyzer.analyze(interpreted_input)
-            response = await self.service.handle_action(message.from_user.id, analysis)
-            await message.answer(response, reply_markup=create_main_keyboard())
+        # Handlers receive these as keyword arguments
+        self.dp["service"] = self.service
+        self.dp["analyzer"] = self.analyzer
+        self.dp.include_router(build_router())
 
     async def start(self):
-        await self.dp.start_polling(self.bot)
+        self.service.start()
+        try:
+            await self.dp.start_polling(self.bot)
+        finally:
+            await self.service.stop()
+
+# --- Database Setup ---
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    # Runs once per pooled connection, so the PRAGMA cost is not paid per query
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+    # Stop the driver from managing transactions itself; begin_sqlite_transaction
+    # emits BEGIN instead, so SAVEPOINTs nest inside the surrounding transaction
+    dbapi_connection.isolation_level = None
+
+def begin_sqlite_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+def configure_sqlite_engine(engine):
+    # These PRAGMAs and the manual BEGIN are SQLite-specific; other databases keep their defaults
+    if engine.dialect.name != "sqlite":
+        return
+    event.listen(engine.sync_engine, "connect", configure_sqlite_connection)
+    event.listen(engine.sync_engine, "begin", begin_sqlite_transaction)
 
 # --- Main ---
 async def main():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///tasks.db",
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        query_cache_size=1200,
+    )
+    configure_sqlite_engine(engine)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    session = async_sessionmaker(engine, expire_on_commit=False)()
-    repository = TaskRepository(session)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
     analyzer = TaskAnalyzer()
-    bot = TaskBot("YOUR_TELEGRAM_BOT_TOKEN", repository, analyzer)
+    bot = TaskBot("YOUR_TELEGRAM_BOT_TOKEN", session_factory, analyzer)
     await bot.start()
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
+        use_io_uring = os.environ.get("TASKBOT_IO_URING") == "1"
+        if use_io_uring:
+            # Lets libuv use io_uring for its own filesystem operations where the kernel
+            # supports it; sockets stay on epoll and SQLite I/O runs in aiosqlite's thread
+            os.environ.setdefault("UV_USE_IO_URING", "1")
+        try:
+            import uvloop
+        except ImportError:
+            if use_io_uring:
+                logging.warning("TASKBOT_IO_URING=1 has no effect because uvloop is not installed")
+            asyncio.run(main())
+        else:
+            asyncio.run(main(), loop_factory=uvloop.new_event_loop)
 
@@ -0,0 +1,278 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from bot import (
+    Base, Task, TaskAnalyzer, TaskBot, TaskCreate, TaskRepository, TaskService,
+    configure_sqlite_engine, handle_message, start_command,
+)
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    configure_sqlite_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def service(session_factory):
+    service = TaskService(session_factory, batch_window=0.05)
+    yield service
+    await service.stop()
+
+
+async def test_concurrent_writes(service):
+    await service.handle_action(1, {"action": "create", "description": "First"})
+    replies = await asyncio.gather(
+        service.handle_action(1, {"action": "update", "id": 1, "description": "First, edited"}),
+        service.handle_action(2, {"action": "create", "description": "Second"}),
+        service.handle_action(3, {"action": "create", "description": "Third"}),
+        service.handle_action(2, {"action": "delete", "id": 1}),
+    )
+    assert replies[0] == "✏️ Task updated: First, edited (ID: 1)"
+    assert replies[1].startswith("✅ Task created: Second")
+    assert replies[2].startswith("✅ Task created: Third")
+    # Task 1 belongs to user 1, so user 2 cannot delete it
+    assert replies[3] == "❌ Task not found"
+    assert await service.handle_action(1, {"action": "list"}) == "📝 ID: 1, Description: First, edited"
+
+
+async def test_failing_write_only_fails_its_caller(service, monkeypatch):
+    update = TaskRepository.update
+
+    async def flaky_update(self, user_id, task_id, task):
+        if task_id == 999:
+            raise RuntimeError("boom")
+        return await update(self, user_id, task_id, task)
+
+    monkeypatch.setattr(TaskRepository, "update", flaky_update)
+    await service.handle_action(1, {"action": "create", "description": "Existing"})
+    replies = await asyncio.gather(
+        service.handle_action(1, {"action": "update", "id": 999, "description": "x"}),
+        service.handle_action(2, {"action": "create", "description": "Unrelated"}),
+        service.handle_action(1, {"action": "update", "id": 1, "description": "Edited"}),
+        return_exceptions=True,
+    )
+    assert isinstance(replies[0], RuntimeError)
+    assert replies[1].startswith("✅ Task created: Unrelated")
+    assert replies[2] == "✏️ Task updated: Edited (ID: 1)"
+    assert await service.handle_action(2, {"action": "list"}) != "📭 No tasks found"
+
+
+@pytest.mark.parametrize("delay", [0, 0.01])  # queued only / taken into a batch
+async def test_stop_fails_pending_writes(service, delay):
+    pending = asyncio.create_task(service.handle_action(1, {"action": "create", "description": "Late"}))
+    await asyncio.sleep(delay)
+    await service.stop()
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(pending, 1)
+
+
+async def test_create_many_matches_rows_to_callers(session_factory):
+    items = [(1, "a"), (2, "a"), (1, "b"), (1, "a"), (2, "c"), (1, "a")]
+    async with session_factory() as session:
+        created = await TaskRepository(session).create_many(
+            [(user_id, TaskCreate(description=description)) for user_id, description in items]
+        )
+        rows = await session.execute(select(Task.id, Task.user_id, Task.description))
+        stored = {row.id: (row.user_id, row.description) for row in rows}
+    assert len({task.id for task in created}) == len(items)
+    for (user_id, description), task in zip(items, created):
+        assert task.description == description
+        assert stored[task.id] == (user_id, description)
+
+
+async def test_multiple_bots_share_handlers(session_factory):
+    analyzer = TaskAnalyzer()
+    first = TaskBot("123456:first", session_factory, analyzer)
+    second = TaskBot("654321:second", session_factory, analyzer)
+    first_router, second_router = first.dp.sub_routers[0], second.dp.sub_routers[0]
+    assert first_router is not second_router
+    for router in (first_router, second_router):
+        assert [h.callback for h in router.message.handlers] == [start_command, handle_message]
+    for task_bot in (first, second):
+        await task_bot.bot.session.close()
+
+
+async def test_analyzer_only_swallows_parse_errors():
+    analyzer = TaskAnalyzer()
+    analyzer.llm.responses = ["not json"]
+    assert await analyzer.analyze("anything") == {"action": None}
+
+    class FailingChain:
+        async def ainvoke(self, inputs):
+            raise ValueError("client error")
+
+    analyzer.chain = FailingChain()
+    with pytest.raises(ValueError, match="client error"):
+        await analyzer.analyze("something else")
+
+
+async def test_write_invalidates_cached_list(service, monkeypatch):
+    queries = 0
+    list_formatted = TaskRepository.list_formatted
+
+    async def counting_list_formatted(self, user_id):
+        nonlocal queries
+        queries += 1
+        return await list_formatted(self, user_id)
+
+    monkeypatch.setattr(TaskRepository, "list_formatted", counting_list_formatted)
+    assert await service.handle_action(1, {"action": "list"}) == "📭 No tasks found"
+    assert await service.handle_action(1, {"action": "list"}) == "📭 No tasks found"
+    assert queries == 1
+    await service.handle_action(1, {"action": "create", "description": "New"})
+    assert await service.handle_action(1, {"action": "list"}) == "📝 ID: 1, Description: New"
+    assert queries == 2
+
+
+async def test_list_racing_a_write_is_not_cached(service, monkeypatch):
+    list_formatted = TaskRepository.list_formatted
+    read_done = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_list_formatted(self, user_id):
+        result = await list_formatted(self, user_id)
+        read_done.set()
+        await release.wait()
+        return result
+
+    monkeypatch.setattr(TaskRepository, "list_formatted", slow_list_formatted)
+    stale_read = asyncio.create_task(service.list_tasks(1))
+    await read_done.wait()
+    await service.handle_action(1, {"action": "create", "description": "New"})
+    release.set()
+    assert await stale_read == ""
+
+    monkeypatch.setattr(TaskRepository, "list_formatted", list_formatted)
+    assert await service.list_tasks(1) == "📝 ID: 1, Description: New"
+
+
+async def test_list_cache_is_bounded(session_factory):
+    service = TaskService(session_factory, list_cache_size=2)
+    for user_id in (1, 2, 3):
+        await service.list_tasks(user_id)
+    assert list(service._list_cache) == [2, 3]
+    assert not service._list_reads
+
+
+async def test_write_after_stop_does_not_restart_writer(service):
+    await service.stop()
+    with pytest.raises(RuntimeError, match="writer stopped"):
+        await service.handle_action(1, {"action": "create", "description": "Too late"})
+    assert service._writer is None
+
+
+def count_chain_calls(analyzer):
+    calls = []
+    chain = analyzer.chain
+
+    class CountingChain:
+        async def ainvoke(self, inputs):
+            calls.append(inputs["input"])
+            return await chain.ainvoke(inputs)
+
+    analyzer.chain = CountingChain()
+    return calls
+
+
+async def test_analyzer_caches_read_only_actions():
+    analyzer = TaskAnalyzer()
+    analyzer.llm.responses = ['{"action": "list"}']
+    calls = count_chain_calls(analyzer)
+    assert await analyzer.analyze("List my tasks") == {"action": "list"}
+    assert await analyzer.analyze("  list MY   tasks ") == {"action": "list"}
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("response", [
+    '{"action": "create", "description": "Buy milk"}',
+    '{"action": "update", "id": 1, "description": "Buy milk"}',
+    '{"action": "delete", "id": 1}',
+])
+async def test_analyzer_never_caches_mutations(response):
+    analyzer = TaskAnalyzer()
+    analyzer.llm.responses = [response]
+    calls = count_chain_calls(analyzer)
+    await analyzer.analyze("same input")
+    await analyzer.analyze("same input")
+    assert len(calls) == 2
+    assert not analyzer.cache
+
+
+async def test_analyzer_cache_evicts_least_recently_used():
+    analyzer = TaskAnalyzer(cache_size=2)
+    analyzer.llm.responses = ['{"action": "read", "id": 1}']
+    calls = count_chain_calls(analyzer)
+    for user_input in ("a", "b", "a", "c"):
+        await analyzer.analyze(user_input)
+    assert list(analyzer.cache) == ["a", "c"]
+    await analyzer.analyze("b")
+    assert calls == ["a", "b", "c", "b"]
+
+
+async def test_analyzer_cache_returns_copies():
+    analyzer = TaskAnalyzer()
+    analyzer.llm.responses = ['{"action": "read", "id": 1}']
+    first = await analyzer.analyze("show task 1")
+    first["id"] = 2
+    assert await analyzer.analyze("show task 1") == {"action": "read", "id": 1}
+
+
+def stub_message(text, answers):
+    async def answer(response, **kwargs):
+        answers.append(response)
+
+    return SimpleNamespace(text=text, from_user=SimpleNamespace(id=1), answer=answer)
+
+
+class StubAnalyzer:
+    def __init__(self, analysis=None, error=None):
+        self.analysis = analysis
+        self.error = error
+
+    async def analyze(self, user_input):
+        if self.error:
+            raise self.error
+        return self.analysis
+
+
+async def test_handle_message_reuses_prefetched_list(service, monkeypatch):
+    queries = []
+
+    async def list_tasks(user_id):
+        queries.append(user_id)
+        return "📝 ID: 7, Description: Prefetched"
+
+    monkeypatch.setattr(service, "list_tasks", list_tasks)
+    answers = []
+    await handle_message(stub_message("📋 List Tasks", answers), service, StubAnalyzer({"action": "list"}))
+    assert answers == ["📝 ID: 7, Description: Prefetched"]
+    assert queries == [1]
+
+
+async def test_handle_message_raises_original_error(service):
+    with pytest.raises(ValueError, match="llm down"):
+        await handle_message(stub_message("list tasks", []), service, StubAnalyzer(error=ValueError("llm down")))
+
+
+@pytest.mark.parametrize("response", [
+    '{"action": "create"}',
+    '{"action": "read"}',
+    '{"action": "update", "description": "No id"}',
+    '{"action": "delete"}',
+])
+async def test_analyzer_rejects_missing_fields(service, response):
+    analyzer = TaskAnalyzer()
+    analyzer.llm.responses = [response]
+    analysis = await analyzer.analyze("incomplete")
+    assert analysis == {"action": None}
+    assert await service.handle_action(1, analysis) == "❌ Invalid action"